@@ -1,18 +1,46 @@
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
 from zipfile import ZipFile
-import tempfile
-import json
 import os
+import warnings
 import polars as pl
 import pandas as pd
+import pyarrow as pa
 import numpy as np
+from scipy.special import boxcox as boxcox_lmbda
 from scipy.stats import boxcox
 from numpy.typing import ArrayLike, NDArray
-from typing import Any
+from typing import Any, Literal
+from collections.abc import Iterable
+from joblib import Parallel, delayed
 from . import log
 from . import survey_helpers as sh
 
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+
+@lru_cache(maxsize=32)
+def _open_zip(zipped_path: Path, mtime: float) -> ZipFile:
+    """Open a zip archive once and reuse the handle across calls.
+    The modification time is part of the cache key so a rewritten archive
+    is reopened rather than served from a stale central directory.
+    """
+    return ZipFile(zipped_path)
+
+
+def clear_load_caches() -> None:
+    """Drop the cached zip handles and decoded tasks held by load_task."""
+    _open_zip.cache_clear()
+    _load_task_frame.cache_clear()
+
+
+# the earlier name, from when only the zip handles were cached
+close_zip_cache = clear_load_caches
+
 
 def load_survey(
     json_path: str | os.PathLike,
@@ -30,15 +58,33 @@ def load_survey(
 
     json_path = Path(json_path)
     survey_date = datetime.fromtimestamp(json_path.stat().st_mtime)
-    resp = dict(sub_id=json_path.parts[-1].split(".")[0], survey_date=survey_date)
+    resp = dict(sub_id=json_path.name.split(".", 1)[0], survey_date=survey_date)
     resp.update(
-        sh.extract_responses(
-            json.loads(json_path.read_text())[0]["response"], decoders=sh.SURVEY_DECODE
-        )
+        sh.SURVEY_EXTRACTOR(json_loads(json_path.read_bytes())[0]["response"])
     )
     return resp
 
 
+def load_surveys(
+    json_paths: Iterable[str | os.PathLike], n_jobs: int = -1
+) -> pl.DataFrame:
+    """Load many survey response jsons in parallel with load_survey.
+    Parameters
+    ----------
+    json_paths : iterable of str
+    n_jobs : int
+        Number of worker processes passed to joblib, -1 uses all cores
+
+    Returns
+    -------
+    res : polars dataframe
+        One row per survey, ready to pass to proc_survey
+    """
+    resps = Parallel(n_jobs=n_jobs)(delayed(load_survey)(jp) for jp in json_paths)
+    # other responses are only present for some surveys, so scan every row
+    return pl.DataFrame(resps, infer_schema_length=None)
+
+
 def unpack_results(jdat, simple_keys, nested_keys):
     row = {}
     for sk in simple_keys:
@@ -60,6 +106,60 @@ def load_flkr_results(filename):
     return res
 
 
+# screening group labels keyed on dep | anx << 1 | atn << 2, with othermh
+# given its own bit because it only applies when the other three are all false
+SCREEN_GROUPS = {
+    0: "hv",
+    8: "othermh",
+    1: "dep",
+    2: "anx",
+    4: "atn",
+    3: "dep_anx",
+    5: "dep_atn",
+    6: "anx_atn",
+    7: "dep_anx_atn",
+}
+
+YES_NO = {"Yes": True, "No": False}
+
+
+def _scale_targets() -> list[tuple[str, str | None, str]]:
+    """Expand sh.SCALES into (column prefix, subscale, output name) for each
+    scale and its today variant."""
+    targets = []
+    for scale, subscale in sh.SCALES:
+        if subscale is None:
+            today_scale = "todayattn" if scale == "attnbin" else "today" + scale
+            targets.append((scale, subscale, scale))
+            targets.append((today_scale, subscale, today_scale))
+        else:
+            targets.append((scale, subscale, f"{scale}_{subscale}"))
+            targets.append(("today" + scale, subscale, f"today{scale}_{subscale}"))
+    return targets
+
+
+SCALE_TARGETS = _scale_targets()
+
+
+def _screen_group(
+    mentalhealth: str, depression: str, anxiety: str, attention: str
+) -> pl.Expr:
+    """Build the screening group label from four boolean columns.
+    Rows with a null in any column needed to decide the group get a null label.
+    """
+    code = (
+        pl.col(depression).cast(pl.UInt8)
+        + pl.col(anxiety).cast(pl.UInt8) * 2
+        + pl.col(attention).cast(pl.UInt8) * 4
+    )
+    code = (
+        pl.when(code == 0)
+        .then(pl.col(mentalhealth).cast(pl.UInt8) * 8)
+        .otherwise(code)
+    )
+    return code.replace_strict(SCREEN_GROUPS, default=None, return_dtype=pl.String)
+
+
 def proc_survey(responses: pl.DataFrame | list[dict[str, Any]]) -> pl.DataFrame:
     """Process list of survey responeses to score scales and subscales
     Parameters
@@ -79,101 +179,30 @@ def proc_survey(responses: pl.DataFrame | list[dict[str, Any]]) -> pl.DataFrame:
         attnbin__5=pl.col("attn__5") == 0,
     )
 
-    # sum all of the scales and subscales
-    exprs = []
-    for scale, subscale in sh.SCALES:
-        if subscale is None:
-            scale_columns = pl.selectors.starts_with(scale)
-            expr = responses.select(scale_columns).sum_horizontal().alias(scale)
-            exprs.append(expr)
-            if scale == "attnbin":
-                scale = "todayattn"
-            else:
-                scale = "today" + scale
-            scale_columns = pl.selectors.starts_with(scale)
-            expr = responses.select(scale_columns).sum_horizontal().alias(scale)
-            exprs.append(expr)
-        else:
-            scale_columns = pl.selectors.starts_with(scale) & pl.selectors.contains(
-                f"_{subscale}_"
-            )
-            expr = (
-                responses.select(scale_columns)
-                .sum_horizontal()
-                .alias(f"{scale}_{subscale}")
-            )
-            exprs.append(expr)
-            scale = "today" + scale
-            scale_columns = pl.selectors.starts_with(scale) & pl.selectors.contains(
-                f"_{subscale}_"
-            )
-            expr = (
-                responses.select(scale_columns)
-                .sum_horizontal()
-                .alias(f"{scale}_{subscale}")
-            )
-            exprs.append(expr)
+    # sum all of the scales and subscales,
+    # bucketing the columns by scale prefix in one pass over the schema
+    by_prefix = {prefix: [] for prefix, _, _ in SCALE_TARGETS}
+    for c in responses.columns:
+        for prefix, matches in by_prefix.items():
+            if c.startswith(prefix):
+                matches.append(c)
+    exprs = [
+        pl.sum_horizontal(
+            [c for c in by_prefix[prefix] if subscale is None or f"_{subscale}_" in c]
+        ).alias(name)
+        for prefix, subscale, name in SCALE_TARGETS
+    ]
 
     responses = responses.with_columns(*exprs)
 
     # create columns for screening groups
     responses = responses.with_columns(
-        screen_group=pl.when(
-            ~pl.col("ongoing_mentalhealth")
-            & ~pl.col("experience_depression")
-            & ~pl.col("experience_anxiety")
-            & ~pl.col("have_adhd")
-        )
-        .then(pl.lit("hv"))
-        .when(
-            pl.col("ongoing_mentalhealth")
-            & ~pl.col("experience_depression")
-            & ~pl.col("experience_anxiety")
-            & ~pl.col("have_adhd")
-        )
-        .then(pl.lit("othermh"))
-        .when(
-            pl.col("experience_depression")
-            & ~pl.col("experience_anxiety")
-            & ~pl.col("have_adhd")
-        )
-        .then(pl.lit("dep"))
-        .when(
-            ~pl.col("experience_depression")
-            & pl.col("experience_anxiety")
-            & ~pl.col("have_adhd")
-        )
-        .then(pl.lit("anx"))
-        .when(
-            ~pl.col("experience_depression")
-            & ~pl.col("experience_anxiety")
-            & pl.col("have_adhd")
+        screen_group=_screen_group(
+            "ongoing_mentalhealth",
+            "experience_depression",
+            "experience_anxiety",
+            "have_adhd",
         )
-        .then(pl.lit("atn"))
-        .when(
-            pl.col("experience_depression")
-            & pl.col("experience_anxiety")
-            & ~pl.col("have_adhd")
-        )
-        .then(pl.lit("dep_anx"))
-        .when(
-            pl.col("experience_depression")
-            & ~pl.col("experience_anxiety")
-            & pl.col("have_adhd")
-        )
-        .then(pl.lit("dep_atn"))
-        .when(
-            ~pl.col("experience_depression")
-            & pl.col("experience_anxiety")
-            & pl.col("have_adhd")
-        )
-        .then(pl.lit("anx_atn"))
-        .when(
-            pl.col("experience_depression")
-            & pl.col("experience_anxiety")
-            & pl.col("have_adhd")
-        )
-        .then(pl.lit("dep_anx_atn"))
     )
 
     return responses
@@ -185,7 +214,9 @@ def load_task(
     subject: str,
     runnum: int,
     as_dateframe: bool = False,
-) -> pl.DataFrame | pd.DataFrame:
+    zero_copy: bool = False,
+    return_type: Literal["polars", "pandas", "arrow"] = "polars",
+) -> pl.DataFrame | pd.DataFrame | pa.Table:
     """Load task from a zipped file. The interior compressed slog corresponding to the task file is extracted without
     uncompressing the entire zipped file for security. Only rows from the slog
     where the run number matches the passed runnum are kept. A field for the subject
@@ -198,25 +229,72 @@ def load_task(
     subject : str
     runnum : int
     as_dataframe : bool
-        If true, return as pandas and not polars
+        Deprecated, use return_type="pandas" instead
+    zero_copy : bool
+        If true, the pandas frame is backed by pyarrow extension arrays
+        instead of copying into numpy dtypes
+    return_type : str
+        One of "polars", "pandas" or "arrow". Arrow tables share the polars
+        buffers without a copy.
 
     Returns
     -------
-    result : polars or pandas dataframe
+    result : polars or pandas dataframe or arrow table
     """
+    if as_dateframe:
+        warnings.warn(
+            'as_dateframe is deprecated, use return_type="pandas" instead',
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        return_type = "pandas"
+    if return_type not in ("polars", "pandas", "arrow"):
+        raise ValueError(
+            f'return_type must be "polars", "pandas" or "arrow", but received {return_type}.'
+        )
     zipped_path = Path(zipped_path)
     if not zipped_path.exists():
         raise FileNotFoundError(zipped_path)
+    mtime = zipped_path.stat().st_mtime
+    # clone so callers modifying their frame in place don't touch the cache
+    loddf = _load_task_frame(
+        zipped_path.resolve(), mtime, task_name, subject, runnum
+    ).clone()
+    if return_type == "pandas":
+        return loddf.to_pandas(use_pyarrow_extension_array=zero_copy)
+    elif return_type == "arrow":
+        return loddf.to_arrow()
+    else:
+        return loddf
+
 
-    with tempfile.TemporaryDirectory() as tmpdir:
-        slog_file = ZipFile(zipped_path).extract(f"log_{task_name}_0.slog", path=tmpdir)
+@lru_cache(maxsize=128)
+def _load_task_frame(
+    zipped_path: Path, mtime: float, task_name: str, subject: str, runnum: int
+) -> pl.DataFrame:
+    """Decode one run of a task into a polars dataframe for load_task. Like
+    _open_zip, the modification time is part of the cache key so a rewritten
+    archive is decoded again."""
+    # stream the slog straight out of the archive rather than extracting it to disk
+    zf = _open_zip(zipped_path, mtime)
+    with zf.open(f"log_{task_name}_0.slog") as slog_file:
         lod = log.log2dl(slog_file)
-        loddf = pl.from_dicts(lod)
-    try:
-        loddf = loddf.filter(pl.col("run_num") == runnum)
-    except pl.exceptions.ColumnNotFoundError:
-        loddf = loddf.filter(pl.col("block") == runnum)
-    file_date = datetime.fromtimestamp(zipped_path.stat().st_mtime)
+    # transpose to a dict of columns so polars can take the columnar constructor
+    cols = dict.fromkeys(k for rec in lod for k in rec)
+    if "run_num" in cols:
+        run_col = "run_num"
+    elif "block" in cols:
+        run_col = "block"
+    else:
+        raise pl.exceptions.ColumnNotFoundError(
+            f"log_{task_name}_0.slog has neither a run_num nor a block column"
+        )
+    # build the frame from every record so the dtypes do not depend on the run,
+    # and filter and derive columns lazily so they are computed in the final
+    # collect, bart collects once more before that as its fill values depend on the data
+    loddf = pl.LazyFrame({k: [rec.get(k) for rec in lod] for k in cols}, strict=False)
+    loddf = loddf.filter(pl.col(run_col) == runnum)
+    file_date = datetime.fromtimestamp(mtime)
     loddf = loddf.with_columns(
         sub_id=pl.lit(subject), zrn=pl.lit(runnum), date=pl.lit(file_date)
     )
@@ -230,27 +308,25 @@ def load_task(
         )
     elif task_name == "bart":
         possible_keys = ["F", "J"]
-        collect_keys = (
+        # the final press on each balloon tells us which key pumps and which collects
+        last_presses = (
             loddf.group_by("balloon_id")
-            .last()
-            .filter(pl.col("pop_status") == "not_popped")
-            .select("key_pressed")
-            .to_series()
+            .agg(pl.col("pop_status").last(), pl.col("key_pressed").last())
+            .collect()
+        )
+        collect_keys = (
+            last_presses.filter(pl.col("pop_status") == "not_popped")["key_pressed"]
             .unique()
-            .to_numpy()
+            .to_list()
         )
         if len(collect_keys) > 1:
             raise ValueError(
                 f"There should only be one collect key per participant, but I found {collect_keys}."
             )
         pump_keys = (
-            loddf.group_by("balloon_id")
-            .last()
-            .filter(pl.col("pop_status") == "popped")
-            .select("key_pressed")
-            .to_series()
+            last_presses.filter(pl.col("pop_status") == "popped")["key_pressed"]
             .unique()
-            .to_numpy()
+            .to_list()
         )
         if len(pump_keys) > 1:
             raise ValueError(
@@ -271,29 +347,123 @@ def load_task(
             for key in possible_keys:
                 if key != collect_key:
                     pump_key = key
-        try:
+        schema = loddf.collect_schema()
+        if "pump_button" in schema and "collect_button" in schema:
             loddf = loddf.with_columns(
                 pl.col("pump_button").fill_null(value=pump_key).alias("pump_button"),
                 pl.col("collect_button")
                 .fill_null(value=collect_key)
                 .alias("collect_button"),
             )
-        except pl.exceptions.ColumnNotFoundError:
+        else:
             loddf = loddf.with_columns(
-                pump_button = pl.lit(pump_key),
+                pump_button=pl.lit(pump_key),
                 collet_button=pl.lit(collect_key),
             )
-    if as_dateframe:
-        return loddf.to_pandas()
-    else:
-        return loddf
+    return loddf.collect()
+
+
+def load_tasks(
+    specs: Iterable[tuple[str | os.PathLike, str, str, int]], n_jobs: int = -1
+) -> pl.DataFrame:
+    """Load many task runs in parallel with load_task and stack them.
+    Parameters
+    ----------
+    specs : iterable of tuple
+        (zipped_path, task_name, subject, runnum) for each run to load
+    n_jobs : int
+        Number of worker processes passed to joblib, -1 uses all cores
+
+    Returns
+    -------
+    result : polars dataframe
+        All runs concatenated, with columns missing from some runs filled with null
+    """
+    loddfs = Parallel(n_jobs=n_jobs)(delayed(load_task)(*spec) for spec in specs)
+    return pl.concat(loddfs, how="diagonal_relaxed")
+
+
+# starting grid for _boxcox_lambda, widened if the maximum is on its edge
+_BOXCOX_GRID = np.linspace(-2, 2, 65)
 
 
-def nanboxcox(x: ArrayLike) -> NDArray[np.float64]:
+def _boxcox_lambda(x: NDArray[np.float64], tol: float = 1e-8) -> float:
+    """Maximum likelihood boxcox lambda, as scipy.stats.boxcox estimates it.
+    The log likelihood is evaluated for a whole grid of lambdas in one
+    scipy.special.boxcox call, and the grid is narrowed around its maximum
+    until it is tol wide, instead of running a scalar optimizer.
+
+    The variance of the transformed values is taken in log space around the
+    mean log value c, var((x^l - 1) / l) = exp(2 l c) var(expm1(l (log x - c)) / l),
+    so it neither cancels for large |lambda| on data with little spread nor
+    for lambda near zero."""
+    if np.any(x <= 0):
+        raise ValueError("Data must be positive.")
+    if np.all(x == x[0]):
+        raise ValueError("Data must not be constant.")
+    n = len(x)
+    logx = np.log(x)
+    logsum = logx.sum()
+    center = logx.mean()
+    dev = (logx - center)[:, None]
+
+    def llf(lmbdas):
+        with np.errstate(over="ignore", invalid="ignore", divide="ignore"):
+            scaled = np.where(
+                lmbdas == 0, dev, np.expm1(lmbdas * dev) / np.where(lmbdas == 0, 1, lmbdas)
+            )
+            logvar = 2 * lmbdas * center + np.log(scaled.var(axis=0))
+            res = (lmbdas - 1) * logsum - n / 2 * logvar
+        return np.where(np.isfinite(res), res, -np.inf)
+
+    grid = _BOXCOX_GRID
+    i = llf(grid).argmax()
+    while i in (0, len(grid) - 1) and np.abs(grid).max() < 1e3:
+        grid = grid * 2
+        i = llf(grid).argmax()
+    lo, hi = grid[max(i - 1, 0)], grid[min(i + 1, len(grid) - 1)]
+    while hi - lo > tol:
+        grid = np.linspace(lo, hi, 17)
+        i = llf(grid).argmax()
+        lo, hi = grid[max(i - 1, 0)], grid[min(i + 1, len(grid) - 1)]
+    return (lo + hi) / 2
+
+
+def _boxcox(x: NDArray[np.float64], lmbda: float | None) -> NDArray[np.float64]:
+    """boxcox transform that only runs the lambda search when lmbda is None"""
+    if lmbda is None:
+        if len(x) == 0:
+            return x.astype(np.float64)
+        return boxcox_lmbda(x, _boxcox_lambda(x))
+    # scipy only checks positivity when it estimates lambda itself
+    if np.any(x <= 0):
+        raise ValueError("Data must be positive.")
+    return boxcox(x, lmbda=lmbda)
+
+
+def fit_boxcox_lambda(x: ArrayLike) -> float:
+    """Estimate the boxcox lambda once, e.g. on a pooled cohort, so it can be
+    passed to nanboxcox or boxcoxmask instead of being refit on every call.
+    Parameters
+    ----------
+    x : ArrayLike
+        Values to fit, nans are ignored
+
+    Returns
+    -------
+    lmbda : float
+    """
+    x = np.asarray(x, dtype=float).ravel()
+    return float(_boxcox_lambda(x[~np.isnan(x)]))
+
+
+def nanboxcox(x: ArrayLike, lmbda: float | None = None) -> NDArray[np.float64]:
     """Run boxcox transformation with nan masking
     Parameters
     ----------
     x : ArrayLike
+    lmbda : float or None
+        Fixed lambda to apply, if None lambda is estimated from x
 
     Returns
     -------
@@ -303,25 +473,28 @@ def nanboxcox(x: ArrayLike) -> NDArray[np.float64]:
         x = x.to_numpy()
     except AttributeError:
         x = np.array(x)
-    res = np.zeros_like(x) * np.nan
+    res = np.full(x.shape, np.nan, dtype=np.result_type(x.dtype, 0.0))
 
     try:
         xmask = ~np.isnan(x)
-        goodx = x[xmask]
-        goodxbc = boxcox(goodx)[0]
-        res[xmask] = goodxbc
+        res[xmask] = _boxcox(x[xmask], lmbda)
     except (IndexError, ValueError):
         pass
     return res
 
 
-def boxcoxmask(x: ArrayLike, thresh: float = 3) -> NDArray[np.bool_]:
+def boxcoxmask(
+    x: ArrayLike, thresh: float = 3, lmbda: float | None = None
+) -> NDArray[np.bool_]:
     """Iteratively run boxcox transformations and drop any values that
     are more than thresh standard deviations away from the mean.
 
     Parameters
     ----------
     x : ArrayLike
+    thresh : float
+    lmbda : float or None
+        Fixed lambda to apply, if None lambda is re-estimated on each pass
 
     Returns
     -------
@@ -331,20 +504,22 @@ def boxcoxmask(x: ArrayLike, thresh: float = 3) -> NDArray[np.bool_]:
         x = x.to_numpy()
     except AttributeError:
         x = np.array(x)
-    tmp = np.zeros_like(x) * np.nan
+    mask = np.zeros_like(x, dtype=bool)
     try:
-        ogxmask = ~np.isnan(x)
-        goodxbc: NDArray[np.float64] = boxcox(x[ogxmask])[0]
-        tmp[ogxmask] = np.abs((goodxbc - goodxbc.mean()) / goodxbc.std())
-        newmask = ogxmask.copy()
-        while tmp[newmask].max() > thresh:
-            newmask = newmask & (tmp < thresh)
-            goodxbc: NDArray[np.float64] = boxcox(x[newmask])[0]
-            tmp = np.zeros_like(x) * np.nan
-            tmp[newmask] = np.abs((goodxbc - goodxbc.mean()) / goodxbc.std())
-        return newmask
+        # work on the flat positions of the kept values so each pass only
+        # touches the shrinking subset instead of full length scratch arrays
+        flatx = x.ravel()
+        keep = np.flatnonzero(~np.isnan(flatx))
+        while True:
+            goodxbc: NDArray[np.float64] = _boxcox(flatx[keep], lmbda)
+            z = np.abs((goodxbc - goodxbc.mean()) / goodxbc.std())
+            if not z.max() > thresh:
+                break
+            keep = keep[z < thresh]
     except (IndexError, ValueError):
-        return np.zeros_like(x, dtype=bool)
+        return mask
+    mask.ravel()[keep] = True
+    return mask
 
 
 def load_prolific_data(prolific_data_path: str | os.PathLike) -> pl.DataFrame:
@@ -357,11 +532,10 @@ def load_prolific_data(prolific_data_path: str | os.PathLike) -> pl.DataFrame:
         .filter(pl.col('sub_id').is_not_null())
         .group_by('sub_id').last()
         .with_columns(
-            pl.when(pl.col('depression') == "Yes").then(True).when(pl.col('depression') == "No").then(False).alias('p_depression'),
-            pl.when(pl.col('anxiety') == "Yes").then(True).when(pl.col('anxiety') == "No").then(False).alias('p_anxiety'),
-            pl.when(pl.col('attention') == "Yes").then(True).when(pl.col('attention') == "No").then(False).alias('p_attention'),
-            pl.when(pl.col('mental_health_ongoing') == "Yes").then(True).when(pl.col('mental_health_ongoing') == "No").then(False).alias('p_mental_health_ongoing'),
-            pl.when(pl.col('mental_illness_impact') == "Yes").then(True).when(pl.col('mental_illness_impact') == "No").then(False).alias('p_mental_illness_impact'),
+            *(
+                pl.col(col).replace_strict(YES_NO, default=None, return_dtype=pl.Boolean).alias(f'p_{col}')
+                for col in ('depression', 'anxiety', 'attention', 'mental_health_ongoing', 'mental_illness_impact')
+            ),
             pl.when(pl.col('age') == 'CONSENT_REVOKED').then(None).otherwise(pl.col('age')).str.to_integer().alias('p_age'),
             pl.when(pl.col('language') == 'CONSENT_REVOKED').then(None).otherwise(pl.col('language')).alias('p_language'),
             pl.when((pl.col('student_status') == 'CONSENT_REVOKED') | (pl.col('student_status') == 'DATA_EXPIRED')).then(None).otherwise(pl.col('student_status')).alias('p_student_status'),
@@ -374,62 +548,9 @@ def load_prolific_data(prolific_data_path: str | os.PathLike) -> pl.DataFrame:
     )
     # create columns for screening groups
     pdf = pdf.with_columns(
-        prolific_screen_group=pl.when(
-            ~pl.col("p_mental_health_ongoing")
-            & ~pl.col("p_depression")
-            & ~pl.col("p_anxiety")
-            & ~pl.col("p_attention")
-        )
-        .then(pl.lit("hv"))
-        .when(
-            pl.col("p_mental_health_ongoing")
-            & ~pl.col("p_depression")
-            & ~pl.col("p_anxiety")
-            & ~pl.col("p_attention")
-        )
-        .then(pl.lit("othermh"))
-        .when(
-            pl.col("p_depression")
-            & ~pl.col("p_anxiety")
-            & ~pl.col("p_attention")
-        )
-        .then(pl.lit("dep"))
-        .when(
-            ~pl.col("p_depression")
-            & pl.col("p_anxiety")
-            & ~pl.col("p_attention")
-        )
-        .then(pl.lit("anx"))
-        .when(
-            ~pl.col("p_depression")
-            & ~pl.col("p_anxiety")
-            & pl.col("p_attention")
-        )
-        .then(pl.lit("atn"))
-        .when(
-            pl.col("p_depression")
-            & pl.col("p_anxiety")
-            & ~pl.col("p_attention")
-        )
-        .then(pl.lit("dep_anx"))
-        .when(
-            pl.col("p_depression")
-            & ~pl.col("p_anxiety")
-            & pl.col("p_attention")
-        )
-        .then(pl.lit("dep_atn"))
-        .when(
-            ~pl.col("p_depression")
-            & pl.col("p_anxiety")
-            & pl.col("p_attention")
-        )
-        .then(pl.lit("anx_atn"))
-        .when(
-            pl.col("p_depression")
-            & pl.col("p_anxiety")
-            & pl.col("p_attention")
+        prolific_screen_group=_screen_group(
+            "p_mental_health_ongoing", "p_depression", "p_anxiety", "p_attention"
         )
-        .then(pl.lit("dep_anx_atn"))
     )
     # make sure that there's only one row of prolific data per subject id
     assert pdf.group_by('sub_id').len()['len'].max() == 1
@@ -64,8 +64,9 @@ class LogReader(object):
 
     Parameters
     ----------
-    filename : string
-        The name of the .slog that you wish to read.
+    filename : string or file-like
+        The name of the .slog that you wish to read, or an open binary
+        stream containing the compressed slog.
     unwrap : boolean
         Whether to unwrap sub-dicts and tuples when reading.
     append_columns : dict
@@ -166,12 +167,14 @@ def log2dl(log_filename: str, unwrap=True, **append_columns) -> list[dict[str, a
 
     Parameters
     ----------
-    log_filename : string
+    log_filename : string or file-like
         Either a full filename with the slog extension or base
         name with everything up to the numerical index of a log,
         such as 'log_study', which will use the same algorithm
         that saved the files each time the experiment was run in
-        in order to loop and read them all in.
+        in order to loop and read them all in. An open binary
+        stream (e.g., a member opened from a zip archive) is read
+        as a single slog.
     unwrap : boolean
         Whether to unwrap logged lists and dictionaries into a
         single row. e.g., 'log': {'time':10, 'error':.001} would
@@ -193,7 +196,10 @@ def log2dl(log_filename: str, unwrap=True, **append_columns) -> list[dict[str, a
 
     """
     # determine set of slogs
-    log_files = _root_to_files(log_filename)
+    if hasattr(log_filename, "read"):
+        log_files = [log_filename]
+    else:
+        log_files = _root_to_files(log_filename)
     if len(log_files) == 0:
         raise IOError("No matching slog files found.")
 
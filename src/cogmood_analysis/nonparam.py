@@ -1,7 +1,152 @@
+from collections import OrderedDict
+import hashlib
 import statsmodels.formula.api as smf
 import statsmodels.api as sm
-import patsy
 import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed, parallel_config
+from scipy.linalg import qr_insert, solve_triangular
+
+# cupy is optional and only needed for use_gpu=True in run_reg_perms and run_reg_boots
+try:
+    import cupy as cp
+except ImportError:
+    cp = None
+
+# covariates shared by the reduced and full models
+NUISANCE_FORMULA = '1 + age + age2 + sex + age:sex + age2:sex'
+
+# nuisance design columns, in the order patsy builds them from NUISANCE_FORMULA
+_NUISANCE_TERMS = ['age', 'age2']
+
+
+def _level_name(level):
+    # patsy labels string levels as-is and everything else by repr
+    return level if isinstance(level, str) else repr(level)
+
+
+def _nuisance_design(dat):
+    """Design matrix of NUISANCE_FORMULA for the rows of dat, built directly
+    instead of through patsy. Numeric sex enters as a single column; bool,
+    string and categorical sex are treatment coded against their first level,
+    with the columns ordered and named the way patsy would."""
+    sex = dat['sex']
+    main = {term: dat[term].to_numpy(dtype=float) for term in _NUISANCE_TERMS}
+    columns = {'Intercept': np.ones(len(dat))}
+    if pd.api.types.is_numeric_dtype(sex) and not pd.api.types.is_bool_dtype(sex):
+        sex_code = sex.to_numpy(dtype=float)
+        columns.update(main)
+        columns['sex'] = sex_code
+        for term in _NUISANCE_TERMS:
+            columns[f'{term}:sex'] = main[term] * sex_code
+        return pd.DataFrame(columns, index=dat.index)
+    
+    if isinstance(sex.dtype, pd.CategoricalDtype):
+        levels = list(sex.cat.categories)
+    elif pd.api.types.is_bool_dtype(sex):
+        levels = [False, True]
+    else:
+        levels = sorted(sex.unique())
+    sex_cols = {
+        f'sex[T.{_level_name(level)}]': (sex == level).to_numpy(dtype=float)
+        for level in levels[1:]
+    }
+    # patsy puts terms without numeric factors straight after the intercept
+    # and each numeric term right before its interactions with sex
+    columns.update(sex_cols)
+    for term in _NUISANCE_TERMS:
+        columns[term] = main[term]
+        for name, code in sex_cols.items():
+            columns[f'{term}:{name}'] = main[term] * code
+    return pd.DataFrame(columns, index=dat.index)
+
+
+def _data_hash(dat, cols):
+    """Digest of the index and the given columns of dat. Numeric columns are
+    hashed from their raw buffers and only other dtypes go through pandas'
+    element-wise hashing, which costs about as much as the fits it guards.
+    The dtype is part of the digest, so categoricals with the same values
+    but other categories do not collide."""
+    digest = hashlib.blake2b()
+    for name, column in [('index', dat.index), *((col, dat[col]) for col in cols)]:
+        values = column.to_numpy()
+        if values.dtype.kind not in 'biufcmM':
+            values = pd.util.hash_array(values)
+        digest.update(f'{name}:{column.dtype!r}:{values.dtype.str}:{values.size};'.encode())
+        digest.update(np.ascontiguousarray(values).tobytes())
+    return digest.digest()
+
+
+# reduced model fits keyed on (score, hash of the data they were fit to)
+_REDUCED_CACHE = OrderedDict()
+_REDUCED_CACHE_SIZE = 32
+
+
+def _reduced_fit(ss, dat):
+    """Fit the nuisance-only model for ss, reusing the fit when the same score
+    and data come back for another tp. Returns the positions of the complete
+    rows, the response, the reduced design, the thin QR of that design, the
+    fitted statsmodels results and a buffer for the full design. The buffer
+    already holds the reduced columns; callers write tp into its last column,
+    so it must not be shared between threads."""
+    cols = [ss, 'age', 'age2', 'sex']
+    key = (ss, _data_hash(dat, cols))
+    if key in _REDUCED_CACHE:
+        _REDUCED_CACHE.move_to_end(key)
+        return _REDUCED_CACHE[key]
+    rows = np.flatnonzero(dat[cols].notna().all(axis=1).to_numpy())
+    complete = dat.iloc[rows]
+    y = complete[[ss]].astype(float)
+    X_reduced = _nuisance_design(complete)
+    Q_reduced, R_reduced = np.linalg.qr(X_reduced.values)
+    reduced_model = sm.OLS(y, X_reduced).fit()
+    X_buf = np.empty((len(rows), X_reduced.shape[1] + 1))
+    X_buf[:, :-1] = X_reduced.values
+    _REDUCED_CACHE[key] = (rows, y, X_reduced, Q_reduced, R_reduced, reduced_model, X_buf)
+    if len(_REDUCED_CACHE) > _REDUCED_CACHE_SIZE:
+        _REDUCED_CACHE.popitem(last=False)
+    return _REDUCED_CACHE[key]
+
+
+def _tp_column(tp, dat, rows):
+    """Values of tp for the rows kept in the reduced design"""
+    x_tp = dat[tp].to_numpy(dtype=float)[rows]
+    if np.isnan(x_tp).any():
+        raise ValueError(f'{tp} has missing values for rows used in the reduced model.')
+    return x_tp
+
+
+def _compact_indexes(indexes, n):
+    """Positional indexes as int32 when they can address all n rows, halving
+    the memory traffic of the gathers compared to int64"""
+    indexes = np.asarray(indexes)
+    if n < 2 ** 31:
+        return indexes.astype(np.int32, copy=False)
+    return indexes
+
+
+def _full_fit(y, X_full, Q_reduced, R_reduced):
+    """OLS fit of y on the full design, whose last column is tp, from the
+    thin QR of the reduced design. Returns the thin QR of the full design,
+    the tp row of R^-1 and its norm, the t-statistic of tp, the residual sum
+    of squares and the R^2."""
+    n, n_params = X_full.shape
+    tp_idx = n_params - 1
+    # Update the reduced QR with the tp column; beta = R^-1 Q'y so no
+    # explicit inverse is needed.
+    # Only the tp row of R^-1 is used, and its norm is sqrt((X'X)^-1[tp, tp])
+    Q, R = qr_insert(Q_reduced, R_reduced, X_full[:, tp_idx], tp_idx, which='col')
+    r_tp = solve_triangular(R, np.eye(n_params)[tp_idx], trans='T')
+    se_factor = np.sqrt(r_tp @ r_tp)
+    
+    beta = solve_triangular(R, Q.T @ y)
+    resid = y - X_full @ beta
+    ssr = resid @ resid
+    centered = y - y.mean()
+    r2 = 1 - ssr / (centered @ centered)
+    t = beta[tp_idx] / (np.sqrt(ssr / (n - n_params)) * se_factor)
+    return Q, r_tp, se_factor, t, ssr, r2
+
 
 # def run_reg_perms(task, tp, ss, dat, perm_indexes):
 #     reduced_model = smf.ols(f'{ss} ~ 1 + age + age2 + sex + age:sex + age2:sex', data=dat).fit()
@@ -31,47 +176,74 @@ import numpy as np
 #         res[f'perm_{pid:04d}']=t_stars[pid]
 #     return res
 
+def _perm_tstats(Q, r_tp, se_factor, fitted, resid, perm_indexes, block_size=1024,
+                 dtype=np.float64):
+    """t-statistics of the tested coefficient for each permutation of the
+    reduced model residuals, given the thin QR (Q, tp row of R^-1) of the
+    full design. Permutations are processed in blocks so the permuted
+    responses never take more than n x block_size of memory. The inputs may
+    be numpy or cupy arrays; the t-statistics come back in the same kind.
+    
+    Since fitted lies in the span of Q, y* = fitted + e* only enters through
+    Q'fitted (computed once) and the permuted residuals e*, which are
+    projected in dtype. float32 halves the memory traffic of that projection
+    and loses little, because nothing large is subtracted in low precision."""
+    xp = np if cp is None else cp.get_array_module(Q)
+    n, n_params = Q.shape
+    n_perms = perm_indexes.shape[1]
+    t_stars = xp.empty(n_perms)
+    
+    beta_fitted = r_tp @ (Q.T @ fitted)
+    # Permuting the residuals does not change their sum of squares
+    resid_ss = resid @ resid
+    Q_t = Q.T.astype(dtype)
+    r_tp_d = r_tp.astype(dtype)
+    resid_d = resid.astype(dtype)
+    for start in range(0, n_perms, block_size):
+        stop = min(start + block_size, n_perms)
+        # Stack the permuted residuals as columns and project them all at once
+        E_star = xp.take(resid_d, perm_indexes[:, start:stop])
+        QtE = Q_t @ E_star
+        betas_tp = beta_fitted + r_tp_d @ QtE
+        
+        # Residual sum of squares by Pythagoras: ||e*||^2 - ||Q'e*||^2
+        rss = resid_ss - xp.sum(QtE ** 2, axis=0, dtype=np.float64)
+        se = xp.sqrt(rss / (n - n_params)) * se_factor
+        t_stars[start:stop] = betas_tp / se
+    return t_stars
+
+
 # claude sped up this function for me based on the above input
-def run_reg_perms(task, tp, ss, dat, perm_indexes):
-    # Fit models once
-    reduced_model = smf.ols(f'{ss} ~ 1 + age + age2 + sex + age:sex + age2:sex', data=dat).fit()
+def run_reg_perms(task, tp, ss, dat, perm_indexes, use_gpu=False, dtype=np.float64):
+    # The reduced model does not depend on tp, so it is shared across calls
+    rows, y, X_reduced, Q_reduced, R_reduced, reduced_model, X_buf = _reduced_fit(ss, dat)
     residuals_reduced = reduced_model.resid.values
     fitted_reduced = reduced_model.fittedvalues.values
 
-    formula = f'{ss} ~ 1 + age + age2 + sex + age:sex + age2:sex + {tp}'
-    full_model = smf.ols(formula, data=dat).fit()
-    t0 = full_model.tvalues[tp]
-    partial_r2 = (reduced_model.ssr - full_model.ssr) / reduced_model.ssr
-    
-    # Pre-build design matrix once
-    y, X = patsy.dmatrices(formula, data=dat, return_type='dataframe')
-    X_array = X.values
-    
-    # Find column index for the test parameter
-    tp_idx = X.columns.get_loc(tp)
+    # Full design is the reduced design with the tp column appended; only
+    # that column changes between calls, so write it into the shared buffer
+    X_buf[:, -1] = _tp_column(tp, dat, rows)
+    Q, r_tp, se_factor, t0, ssr_full, full_r2 = _full_fit(
+        y.values.ravel(), X_buf, Q_reduced, R_reduced
+    )
+    partial_r2 = (reduced_model.ssr - ssr_full) / reduced_model.ssr
     
-    # Vectorized permutation loop
     n_perms = perm_indexes.shape[1]
     t_stars = np.empty(n_perms + 1)
     t_stars[0] = t0
     
-    # Pre-compute X'X inverse
-    XtX_inv = np.linalg.inv(X_array.T @ X_array)
-    
-    for pid in range(n_perms):
-        # Create permuted y
-        y_star = fitted_reduced + residuals_reduced[perm_indexes[:, pid]]
-        
-        # Direct regression computation: beta = (X'X)^-1 X'y
-        beta = XtX_inv @ (X_array.T @ y_star)
-        
-        # Compute residuals and standard error
-        residuals = y_star - X_array @ beta
-        mse = np.sum(residuals ** 2) / (len(y_star) - X_array.shape[1])
-        se = np.sqrt(mse * XtX_inv[tp_idx, tp_idx])
-        
-        # t-statistic
-        t_stars[pid + 1] = beta[tp_idx] / se
+    perm_args = (
+        Q, r_tp, se_factor, fitted_reduced, residuals_reduced,
+        _compact_indexes(perm_indexes, len(fitted_reduced))
+    )
+    if use_gpu:
+        # Same kernel on the GPU: one transfer of the inputs, GEMMs on device
+        if cp is None:
+            raise ImportError('use_gpu=True requires cupy to be installed.')
+        perm_args = [cp.asarray(arg) for arg in perm_args]
+        t_stars[1:] = cp.asnumpy(_perm_tstats(*perm_args, dtype=dtype))
+    else:
+        t_stars[1:] = _perm_tstats(*perm_args, dtype=dtype)
     
     p_value = np.mean(np.abs(t_stars) >= np.abs(t0))
     
@@ -80,7 +252,7 @@ def run_reg_perms(task, tp, ss, dat, perm_indexes):
         parameter=tp,
         score=ss,
         t=t0,
-        full_r2=full_model.rsquared,
+        full_r2=full_r2,
         partial_r2=partial_r2,
         perm_p=p_value
     )
@@ -89,6 +261,84 @@ def run_reg_perms(task, tp, ss, dat, perm_indexes):
     
     return res
 
+
+def _perm_tstats_many(Q_reduced, X_tp, resid, perm_indexes, block_size=1024):
+    """t-statistics of each column of X_tp, each added on its own to the
+    reduced design, for every permutation of the reduced model residuals
+    (n_tp x n_perms). By Frisch-Waugh-Lovell a tested column only enters
+    through its component orthogonal to the reduced design, so the permuted
+    residuals are projected once onto the reduced design and once onto all
+    of the orthogonalized tp columns together."""
+    n, n_reduced = Q_reduced.shape
+    n_perms = perm_indexes.shape[1]
+    # Orthogonalize the tp columns against the reduced design, twice so the
+    # result stays orthogonal to working precision
+    X_orth = X_tp - Q_reduced @ (Q_reduced.T @ X_tp)
+    X_orth -= Q_reduced @ (Q_reduced.T @ X_orth)
+    norms = np.sqrt(np.einsum('np,np->p', X_orth, X_orth))
+    Q_tp = X_orth / norms
+    
+    t_stars = np.empty((X_tp.shape[1], n_perms))
+    resid_ss = resid @ resid
+    for start in range(0, n_perms, block_size):
+        stop = min(start + block_size, n_perms)
+        E_star = np.take(resid, perm_indexes[:, start:stop])
+        QzE = Q_reduced.T @ E_star
+        # Residual sums of squares by Pythagoras, first of the reduced fit
+        reduced_ss = resid_ss - np.einsum('kb,kb->b', QzE, QzE)
+        QtE = Q_tp.T @ E_star
+        # The fitted values lie in the reduced span, so only e* moves beta_tp
+        rss = reduced_ss - QtE ** 2
+        t_stars[:, start:stop] = QtE / np.sqrt(rss / (n - n_reduced - 1))
+    return t_stars
+
+
+def run_reg_perms_many(task, tps, sss, dat, perm_indexes):
+    """run_reg_perms for every combination of tp in tps and ss in sss. For
+    each score the permuted residuals are gathered and projected once and
+    shared by all of the tps. Returns the result dicts in the order of
+    itertools.product(tps, sss)."""
+    perm_indexes = np.asarray(perm_indexes)
+    results = {}
+    for ss in sss:
+        rows, y, X_reduced, Q_reduced, R_reduced, reduced_model, X_buf = _reduced_fit(ss, dat)
+        y_arr = y.values.ravel()
+        resid = reduced_model.resid.values
+        X_tp = np.column_stack([_tp_column(tp, dat, rows) for tp in tps])
+        t_stars = _perm_tstats_many(
+            Q_reduced, X_tp, resid, _compact_indexes(perm_indexes, len(resid))
+        )
+        for tp, x_tp, tp_t_stars in zip(tps, X_tp.T, t_stars):
+            X_buf[:, -1] = x_tp
+            _, _, _, t0, ssr_full, full_r2 = _full_fit(y_arr, X_buf, Q_reduced, R_reduced)
+            partial_r2 = (reduced_model.ssr - ssr_full) / reduced_model.ssr
+            p_value = (1 + np.sum(np.abs(tp_t_stars) >= np.abs(t0))) / (len(tp_t_stars) + 1)
+            results[tp, ss] = dict(
+                task=task,
+                parameter=tp,
+                score=ss,
+                t=t0,
+                full_r2=full_r2,
+                partial_r2=partial_r2,
+                perm_p=p_value
+            )
+    return [results[tp, ss] for tp in tps for ss in sss]
+
+
+def run_all_perms(triples, dat, perm_indexes, n_jobs=-1):
+    """Run run_reg_perms for each (task, tp, ss) triple in a pool of worker
+    processes. BLAS is limited to one thread per worker so the workers do not
+    oversubscribe the cores. Each worker keeps its own cache of reduced fits,
+    and joblib memory maps the large arrays in dat and perm_indexes instead of
+    copying them to every task. Returns the result dicts in the order of
+    triples."""
+    with parallel_config(backend='loky', inner_max_num_threads=1):
+        return Parallel(n_jobs=n_jobs)(
+            delayed(run_reg_perms)(task, tp, ss, dat, perm_indexes)
+            for task, tp, ss in triples
+        )
+
+
 # def run_reg_boots(task, tp, ss, dat, boot_indexes):
 #     full_formula = f'{ss} ~ 1 + age + age2 + sex + age:sex + age2:sex + {tp}'
 #     full_model = smf.ols(full_formula, data=dat).fit()
@@ -136,21 +386,128 @@ def run_reg_perms(task, tp, ss, dat, perm_indexes):
 #     )
 #     return res
 
+def _boot_weights(boot_pos, n):
+    """Multinomial weights of the bootstrap resamples in boot_pos, the number
+    of times each of the n rows is drawn in each resample (n x n_boots)"""
+    xp = np if cp is None else cp.get_array_module(boot_pos)
+    n_draws, n_boots = boot_pos.shape
+    offsets = xp.arange(n_boots, dtype=np.int64) * n
+    counts = xp.bincount((boot_pos + offsets).ravel(), minlength=n * n_boots)
+    return counts.reshape(n_boots, n).T.astype(np.float64)
+
+
+# smallest diagonal of the Cholesky factor of the scaled X'WX that the batched
+# solve accepts, below it a resample's design is treated as rank deficient
+_CHOL_MIN_DIAG = 1e-6
+
+
+def _scaled_cholesky(A):
+    """Cholesky factors of a stack of normal equation matrices after scaling
+    each to unit diagonal, which keeps columns on very different scales (age
+    and age2) from inflating the condition number. Returns the factors, the
+    scales and a mask of the matrices that are singular or too ill
+    conditioned to solve this way; those get an identity factor."""
+    xp = np if cp is None else cp.get_array_module(A)
+    scale = xp.sqrt(xp.diagonal(A, axis1=1, axis2=2)).copy()
+    bad = ~(scale > 0).all(axis=1)
+    scale[scale == 0] = 1.0
+    A_scaled = A / (scale[:, :, None] * scale[:, None, :])
+    A_scaled[bad] = xp.eye(A.shape[1])
+    try:
+        L = xp.linalg.cholesky(A_scaled)
+    except np.linalg.LinAlgError:
+        # find the resamples that failed and factor the rest
+        L = xp.empty_like(A_scaled)
+        for i, a in enumerate(A_scaled):
+            try:
+                L[i] = xp.linalg.cholesky(a)
+            except np.linalg.LinAlgError:
+                bad[i] = True
+    # cupy does not raise on a failed factorization but leaves nans, which
+    # fail this check as well
+    bad |= ~(xp.diagonal(L, axis1=1, axis2=2).min(axis=1) >= _CHOL_MIN_DIAG)
+    L[bad] = xp.eye(A.shape[1])
+    return L, scale, bad
+
+
+def _pinv_ssr_t(X, y, w, n_draws, tp_idx=None):
+    """Residual sum of squares and t-statistic of one weighted resample from
+    the pseudoinverse, as statsmodels fits a rank deficient design"""
+    sqrt_w = np.sqrt(w)
+    Xw = X * sqrt_w[:, None]
+    pinv_X = np.linalg.pinv(Xw)
+    beta = pinv_X @ (y * sqrt_w)
+    resid = y - X @ beta
+    ssr = w @ resid ** 2
+    if tp_idx is None:
+        return ssr, None
+    rank = np.linalg.matrix_rank(Xw)
+    var_factor = pinv_X[tp_idx] @ pinv_X[tp_idx]
+    return ssr, beta[tp_idx] / np.sqrt(ssr / (n_draws - rank) * var_factor)
+
+
+def _boot_ssr_t(X, y, boot_pos, tp_idx=None, block_size=256):
+    """Residual sums of squares and, if tp_idx is given, t-statistics of that
+    coefficient for the OLS fit on each bootstrap resample. boot_pos holds the
+    positional row indices of one resample per column. A resample is fit as
+    the regression on all rows weighted by how often each row was drawn, so
+    every sum over a block of resamples is a matrix product with the weights
+    instead of a gather of the resampled rows. Resamples whose design is
+    rank deficient, e.g. drawing only one sex, are fit with the pseudoinverse
+    like statsmodels instead. The inputs may be numpy or cupy arrays; the
+    results come back in the same kind, though the rank deficient resamples
+    are always refit on the host."""
+    xp = np if cp is None else cp.get_array_module(X)
+    n_draws, n_boots = boot_pos.shape
+    n, n_params = X.shape
+    ssr = xp.empty(n_boots)
+    t = None if tp_idx is None else xp.empty(n_boots)
+    if tp_idx is not None:
+        e_tp = xp.zeros((n_params, 1))
+        e_tp[tp_idx] = 1.0
+    # Row-wise products making up X'WX and X'Wy for any weights W
+    XX = (X[:, :, None] * X[:, None, :]).reshape(n, -1)
+    Xy = X * y[:, None]
+    for start in range(0, n_boots, block_size):
+        stop = min(start + block_size, n_boots)
+        W = _boot_weights(boot_pos[:, start:stop], n)
+        # Normal equations for every resample at once, solved through the
+        # Cholesky factor L L' = S^-1 X'WX S^-1 of the scaled matrix rather
+        # than an explicit inverse
+        A = (W.T @ XX).reshape(-1, n_params, n_params)
+        rhs = W.T @ Xy
+        L, scale, bad = _scaled_cholesky(A)
+        z = xp.linalg.solve(L, (rhs / scale)[..., None])
+        beta = xp.linalg.solve(xp.swapaxes(L, -1, -2), z)[..., 0] / scale
+        resid = y[:, None] - X @ beta.T
+        ssr[start:stop] = xp.einsum('nb,nb,nb->b', W, resid, resid)
+        if tp_idx is not None:
+            # (X'WX)^-1[tp, tp] = ||L^-1 e_tp||^2 / s_tp^2
+            w = xp.linalg.solve(L, xp.broadcast_to(e_tp, (len(L), n_params, 1)))[..., 0]
+            var_factor = xp.einsum('bi,bi->b', w, w) / scale[:, tp_idx] ** 2
+            t[start:stop] = beta[:, tp_idx] / xp.sqrt(ssr[start:stop] / (n_draws - n_params) * var_factor)
+        X_host, y_host = X, y
+        if xp is not np:
+            bad = cp.asnumpy(bad)
+            if bad.any():
+                X_host, y_host, W = cp.asnumpy(X), cp.asnumpy(y), cp.asnumpy(W)
+        for i in np.flatnonzero(bad):
+            boot_ssr, boot_t = _pinv_ssr_t(X_host, y_host, W[:, i], n_draws, tp_idx)
+            ssr[start + i] = boot_ssr
+            if tp_idx is not None:
+                t[start + i] = boot_t
+    return ssr, t
+
+
 # speed up suggested by cluade based on the above code
-def run_reg_boots(task, tp, ss, dat, boot_indexes):
-    # Build design matrices once using patsy
-    formula_reduced = f'{ss} ~ 1 + age + age2 + sex + age:sex + age2:sex'
-    formula_full = f'{ss} ~ 1 + age + age2 + sex + age:sex + age2:sex + {tp}'
-    
-    y, X_reduced = patsy.dmatrices(formula_reduced, data=dat, return_type='dataframe')
-    _, X_full = patsy.dmatrices(formula_full, data=dat, return_type='dataframe')
-    
-    # Fit original models using matrix API
-    reduced_model = sm.OLS(y, X_reduced).fit()
-    full_model = sm.OLS(y, X_full).fit()
-    
-    t0 = full_model.tvalues[tp]
-    partial_r2 = (reduced_model.ssr - full_model.ssr) / reduced_model.ssr
+def run_reg_boots(task, tp, ss, dat, boot_indexes, use_gpu=False):
+    # The reduced model does not depend on tp, so it is shared across calls
+    rows, y, X_reduced, Q_reduced, R_reduced, reduced_model, X_buf = _reduced_fit(ss, dat)
+    y_arr = y.values.ravel()
+    X_buf[:, -1] = _tp_column(tp, dat, rows)
+    tp_idx = X_buf.shape[1] - 1
+    _, _, _, t0, ssr_full, full_r2 = _full_fit(y_arr, X_buf, Q_reduced, R_reduced)
+    partial_r2 = (reduced_model.ssr - ssr_full) / reduced_model.ssr
     
     n_boots = boot_indexes.shape[1]
     boot_ts = np.empty(n_boots + 1)
@@ -159,21 +516,27 @@ def run_reg_boots(task, tp, ss, dat, boot_indexes):
     boot_pr2s = np.empty(n_boots + 1)
     boot_pr2s[0] = partial_r2
     
-    for bid in range(n_boots):
-        # Get the boot indices - these are pandas index labels
-        boot_idx = boot_indexes[:, bid]
-        
-        # Index the design matrices using the pandas index
-        y_boot = y.loc[boot_idx]
-        X_reduced_boot = X_reduced.loc[boot_idx]
-        X_full_boot = X_full.loc[boot_idx]
-        
-        # Fit models on bootstrapped data
-        boot_reduced_model = sm.OLS(y_boot, X_reduced_boot).fit()
-        boot_full_model = sm.OLS(y_boot, X_full_boot).fit()
-        
-        boot_ts[bid + 1] = boot_full_model.tvalues[tp]
-        boot_pr2s[bid + 1] = (boot_reduced_model.ssr - boot_full_model.ssr) / boot_reduced_model.ssr
+    # Work on plain arrays; boot indexes are pandas index labels, so translate
+    # them to positions in the design once
+    Xr_arr = X_reduced.values
+    boot_pos = X_reduced.index.get_indexer(boot_indexes.ravel())
+    if (boot_pos < 0).any():
+        raise KeyError('boot_indexes contains labels that are not complete rows of dat.')
+    boot_pos = _compact_indexes(boot_pos.reshape(boot_indexes.shape), len(y_arr))
+    
+    if use_gpu:
+        # Same fits on the GPU: one transfer of the inputs, GEMMs and batched
+        # solves on device
+        if cp is None:
+            raise ImportError('use_gpu=True requires cupy to be installed.')
+        Xr_d, X_d, y_d, boot_pos_d = [cp.asarray(arg) for arg in (Xr_arr, X_buf, y_arr, boot_pos)]
+        ssr_r, _ = _boot_ssr_t(Xr_d, y_d, boot_pos_d)
+        ssr_f, boot_ts_d = _boot_ssr_t(X_d, y_d, boot_pos_d, tp_idx)
+        ssr_r, ssr_f, boot_ts[1:] = cp.asnumpy(ssr_r), cp.asnumpy(ssr_f), cp.asnumpy(boot_ts_d)
+    else:
+        ssr_r, _ = _boot_ssr_t(Xr_arr, y_arr, boot_pos)
+        ssr_f, boot_ts[1:] = _boot_ssr_t(X_buf, y_arr, boot_pos, tp_idx)
+    boot_pr2s[1:] = (ssr_r - ssr_f) / ssr_r
     
     # Compute quantiles once
     boot_t_quantiles = np.quantile(boot_ts, [0.005, 0.025, 0.975, 0.995])
@@ -184,7 +547,7 @@ def run_reg_boots(task, tp, ss, dat, boot_indexes):
         parameter=tp,
         score=ss,
         t=t0,
-        full_r2=full_model.rsquared,
+        full_r2=full_r2,
         partial_r2=partial_r2,
         boot_t_mean=boot_ts.mean(),
         boot_t_std=boot_ts.std(),
@@ -199,4 +562,15 @@ def run_reg_boots(task, tp, ss, dat, boot_indexes):
         boot_pr2_975=boot_pr2_quantiles[2],
         boot_pr2_995=boot_pr2_quantiles[3]
     )
-    return res
\ No newline at end of file
+    return res
+
+
+def run_all_boots(triples, dat, boot_indexes, n_jobs=-1):
+    """Run run_reg_boots for each (task, tp, ss) triple in a pool of worker
+    processes, the same way run_all_perms does for run_reg_perms. Returns the
+    result dicts in the order of triples."""
+    with parallel_config(backend='loky', inner_max_num_threads=1):
+        return Parallel(n_jobs=n_jobs)(
+            delayed(run_reg_boots)(task, tp, ss, dat, boot_indexes)
+            for task, tp, ss in triples
+        )
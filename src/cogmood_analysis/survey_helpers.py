@@ -1,9 +1,21 @@
 from collections.abc import Callable
-from copy import copy
+from functools import lru_cache, partial
+from inspect import signature
+import re
+import sys
 from typing import Any
 
+import numpy as np
+import polars as pl
 
-def yn_code(field: str, resp: str | None) -> dict[str, bool | None]:
+
+# coded values of the yes-no responses
+YN_CODES = {"Yes": True, "No": False, "Prefer not to answer": None, None: None}
+
+
+def yn_code(
+    field: str, resp: str | None, out: dict[str, Any] | None = None
+) -> dict[str, bool | None]:
     """Transform yes-no fields to boolean responses
     Parameters
     ----------
@@ -11,6 +23,8 @@ def yn_code(field: str, resp: str | None) -> dict[str, bool | None]:
         Name of the field
     resp : str or None
         Response
+    out : dict, optional
+        Dictionary to write the coded response into, a new one is used if not given
 
     Returns
     -------
@@ -18,23 +32,46 @@ def yn_code(field: str, resp: str | None) -> dict[str, bool | None]:
         dictionary with field as key and coded response as value
 
     """
-    if resp == "Yes":
-        return {field: True}
-    elif resp == "No":
-        return {field: False}
-    elif resp == "Prefer not to answer":
-        return {field: None}
-    elif resp is None:
-        return {field: None}
-    elif "Not applicable" in resp:
-        return {field: None}
-    else:
+    if out is None:
+        out = {}
+    try:
+        out[field] = YN_CODES[resp]
+        return out
+    except (KeyError, TypeError):
+        pass
+    if isinstance(resp, str) and "Not applicable" in resp:
+        out[field] = None
+        return out
+    raise ValueError(
+        f"Expected Yes, No, Perfer not to Answer, None or Not applicable, but received {resp}"
+    )
+
+
+def _yn_code_vec(field: str, resp: pl.Series) -> pl.DataFrame:
+    """yn_code for a column of responses"""
+    if resp.dtype == pl.Null:
+        return pl.DataFrame({field: resp.cast(pl.Boolean)})
+    if resp.dtype != pl.String:
+        raise ValueError(f"Expected yes-no responses to be strings, but received {resp.dtype}")
+    codes = {k: v for k, v in YN_CODES.items() if k is not None}
+    known = (
+        resp.is_in(list(codes)) | resp.str.contains("Not applicable", literal=True)
+    ).fill_null(True)
+    if not known.all():
         raise ValueError(
-            f"Expected Yes, No, Perfer not to Answer, None or Not applicable, but received {resp}"
+            f"Expected Yes, No, Perfer not to Answer, None or Not applicable, but received {resp.filter(~known)[0]}"
         )
+    return pl.DataFrame(
+        {field: resp.replace_strict(codes, default=None, return_dtype=pl.Boolean)}
+    )
+
+
+yn_code.vectorized = _yn_code_vec
 
 
-def str_code(field: str, resp: str) -> dict[str, str]:
+def str_code(
+    field: str, resp: str, out: dict[str, Any] | None = None
+) -> dict[str, str]:
     """Passthrough transform for string fields.
     Parameters
     ----------
@@ -42,6 +79,8 @@ def str_code(field: str, resp: str) -> dict[str, str]:
         Name of the field
     resp : str
         Response
+    out : dict, optional
+        Dictionary to write the coded response into, a new one is used if not given
 
     Returns
     -------
@@ -49,36 +88,77 @@ def str_code(field: str, resp: str) -> dict[str, str]:
         dictionary with field as key and coded response as value
     """
     if isinstance(resp, str):
-        return {field: resp}
+        if out is None:
+            return {field: resp}
+        out[field] = resp
+        return out
     else:
         raise ValueError(
             f"expected resp to be a string, but received {resp} of type {type(resp)}"
         )
 
 
-def num_code(field: str, resp: str | None) -> dict[str, float | None]:
+def _str_code_vec(field: str, resp: pl.Series) -> pl.DataFrame:
+    """str_code for a column of responses, nulls are missing responses and
+    stay null"""
+    if resp.dtype == pl.Null:
+        return pl.DataFrame({field: resp.cast(pl.String)})
+    if resp.dtype != pl.String:
+        raise ValueError(f"expected resp to be strings, but received {resp.dtype}")
+    return pl.DataFrame({field: resp})
+
+
+str_code.vectorized = _str_code_vec
+
+
+def num_code(
+    field: str, resp: str | None, out: dict[str, Any] | None = None
+) -> dict[str, float | None]:
     """Transform for numeric fields.
     Parameters
     ----------
     field : str
         Name of the field
     resp : str
-        Response
+        Response, None and empty strings are coded as None
+    out : dict, optional
+        Dictionary to write the coded response into, a new one is used if not given
 
     Returns
     -------
     result : dict
         dictionary with field as key and coded response as value
     """
+    if out is None:
+        out = {}
+    if resp is None or resp == "":
+        out[field] = None
+        return out
     try:
-        if resp is None:
-            return {field: None}
-        return {field: float(resp)}
-    except:
-        raise ValueError(f"Someting failed when trying to convert {resp} to a float")
+        out[field] = float(resp)
+    except (TypeError, ValueError) as err:
+        raise ValueError(
+            f"Someting failed when trying to convert {resp} to a float"
+        ) from err
+    return out
+
 
+def _num_code_vec(field: str, resp: pl.Series) -> pl.DataFrame:
+    """num_code for a column of responses"""
+    if resp.dtype == pl.String:
+        resp = resp.replace("", None).str.strip_chars()
+    try:
+        return pl.DataFrame({field: resp.cast(pl.Float64)})
+    except pl.exceptions.PolarsError as err:
+        raise ValueError(f"Someting failed when trying to convert {field} to a float") from err
 
-def likert_code(field: str, resp: str | None) -> dict[str, float | int]:
+
+num_code.vectorized = _num_code_vec
+
+
+def likert_code(
+    field: str, resp: str | None, out: dict[str, Any] | None = None
+) -> dict[str, float | int]:
     """Transform for likert filds that takes the number from before the colon if present
     Parameters
     ----------
@@ -86,13 +166,56 @@ def likert_code(field: str, resp: str | None) -> dict[str, float | int]:
         Name of the field
     resp : str
         Response
+    out : dict, optional
+        Dictionary to write the coded response into, a new one is used if not given
 
     Returns
     -------
     result : dict
         dictionary with field as key and coded response as value
     """
-    return {field: int(resp.split(":")[0])}
+    if not isinstance(resp, str):
+        raise ValueError(
+            f"expected resp to be a string, but received {resp} of type {type(resp)}"
+        )
+    # partition stops at the first colon and does not build a list
+    if out is None:
+        return {field: int(resp.partition(":")[0])}
+    out[field] = int(resp.partition(":")[0])
+    return out
+
+
+def _likert_code_vec(field: str, resp: pl.Series) -> pl.DataFrame:
+    """likert_code for a column of responses, nulls are missing responses and
+    stay null"""
+    if resp.dtype == pl.Null:
+        return pl.DataFrame({field: resp.cast(pl.Int64)})
+    if resp.dtype != pl.String:
+        raise ValueError(f"expected likert responses to be strings, but received {resp.dtype}")
+    try:
+        coded = (
+            resp.str.splitn(":", 2)
+            .struct.field("field_0")
+            .str.strip_chars()
+            .cast(pl.Int64)
+        )
+    except pl.exceptions.PolarsError as err:
+        raise ValueError(f"Someting failed when trying to convert {field} to an int") from err
+    return pl.DataFrame({field: coded})
+
+
+likert_code.vectorized = _likert_code_vec
+
+
+# separators in choices that become underscores in column names
+_CLEAN_TRANS = str.maketrans({c: "_" for c in "-:,() /"})
+_MULTI_UNDERSCORE = re.compile(r"_{2,}")
+
+
+def _clean_choice(choice: str) -> str:
+    """Lowercase a choice and replace punctuation and spaces with underscores
+    so it can be used in a column name"""
+    return _MULTI_UNDERSCORE.sub("_", choice.lower().translate(_CLEAN_TRANS))
 
 
 def ohe_fac(
@@ -116,56 +239,151 @@ def ohe_fac(
     Returns
     -------
     ohe : function
-        transformer function for one hot encoding the field
+        transformer function for one hot encoding the field, shared between
+        calls with the same arguments
     """
-    choices = copy(choices)
-    if other:
-        choices.append("other")
-    if none:
-        choices.append("none")
+    return _ohe_fac(tuple(choices), other, none, force_list)
 
-    def ohe(field: str, resp: str | list[str]) -> dict[str, bool]:
-        if resp is None:
-            resp = []
-        if not isinstance(resp, list):
-            if force_list:
-                resp = [resp]
-            else:
-                raise ValueError(f"Expected resp to be a list, but received {resp}.")
-        ohe_resp = {}
-        for choice in choices:
-            clean_choice = (
-                choice.lower()
-                .replace("-", "_")
-                .replace(":", "_")
-                .replace(",", "_")
-                .replace(" ", "_")
-                .replace("(", "_")
-                .replace(")", "_")
-                .replace("/", "_")
-                .replace("__", "_")
-                .replace("__", "_")
+
+@lru_cache(maxsize=None)
+def _ohe_fac(
+    choices: tuple[str, ...], other: bool, none: bool, force_list: bool
+) -> Callable[[str, str | list[str]], dict[str, bool]]:
+    """ohe_fac memoized on its (hashable) arguments"""
+    choices = (*choices, *(("other",) if other else ()), *(("none",) if none else ()))
+    # cleaning only depends on the choices, so do it once here
+    cleaned = [(_clean_choice(choice), choice) for choice in choices]
+    # (column name, choice) pairs for each field the encoder has been used on,
+    # the names are interned as they are hashed again for every response
+    field_keys = {}
+
+    def _keys(field: str) -> tuple[tuple[str, str], ...]:
+        keys = field_keys.get(field)
+        if keys is None:
+            keys = field_keys[field] = tuple(
+                (sys.intern(f"{field}__{clean_choice}"), choice)
+                for clean_choice, choice in cleaned
             )
-            ohe_resp[f"{field}__{clean_choice}"] = choice in resp
-        return ohe_resp
+        return keys
+
+    # all False encoding for each field, copied out for skipped questions
+    field_empty = {}
+
+    def _empty(field: str) -> dict[str, bool]:
+        empty = field_empty.get(field)
+        if empty is None:
+            empty = field_empty[field] = dict.fromkeys(
+                (key for key, _ in _keys(field)), False
+            )
+        return empty
+
+    def _resp_set(resp: Any) -> set[str] | frozenset[str]:
+        # set responses are used as they are, other responses are put in one
+        if resp is None:
+            return frozenset()
+        if isinstance(resp, (set, frozenset)):
+            return resp
+        if isinstance(resp, list):
+            return frozenset(resp)
+        if force_list:
+            return frozenset((resp,))
+        raise ValueError(f"Expected resp to be a list, but received {resp}.")
+
+    def ohe(
+        field: str,
+        resp: str | list[str] | set[str] | frozenset[str] | None,
+        out: dict[str, Any] | None = None,
+    ) -> dict[str, bool]:
+        if resp is None or (not resp and isinstance(resp, (list, set, frozenset))):
+            # skipped question, nothing to look up
+            if out is None:
+                return _empty(field).copy()
+            out.update(_empty(field))
+            return out
+        resp_set = _resp_set(resp)
+        if out is None:
+            return {key: choice in resp_set for key, choice in _keys(field)}
+        for key, choice in _keys(field):
+            out[key] = choice in resp_set
+        return out
+
+    def ohe_vec(field: str, resp: pl.Series) -> pl.DataFrame:
+        if resp.dtype == pl.String:
+            if not force_list and resp.null_count() < len(resp):
+                raise ValueError("Expected resp to be a list, but received strings.")
+            return pl.DataFrame({key: resp == choice for key, choice in _keys(field)})
+        if not isinstance(resp.dtype, (pl.List, pl.Null)):
+            raise ValueError(f"Expected resp to be a list, but received {resp.dtype}.")
+        # missing responses are null and stay null in every column
+        resp = resp.cast(pl.List(pl.String))
+        return pl.DataFrame(
+            {key: resp.list.contains(choice) for key, choice in _keys(field)}
+        )
+
+    # bit of each choice in a response mask, one bit per output column
+    bits = {}
+    for i, (_, choice) in enumerate(cleaned):
+        bits[choice] = bits.get(choice, 0) | 1 << i
+
+    def ohe_values(field: str, values: list[Any]) -> pl.DataFrame:
+        if len(cleaned) > 64:
+            return pl.DataFrame([ohe(field, resp) for resp in values])
+        # pack each response into one uint64 and unpack all rows at once, the
+        # little endian bytes keep bit i in column i on any platform
+        masks = np.zeros(len(values), dtype=np.uint64)
+        for row, resp in enumerate(values):
+            mask = 0
+            for choice in _resp_set(resp):
+                mask |= bits.get(choice, 0)
+            masks[row] = mask
+        onehot = np.unpackbits(
+            masks.astype("<u8", copy=False).view(np.uint8).reshape(-1, 8),
+            axis=1, count=len(cleaned), bitorder="little",
+        ).astype(bool)
+        return pl.DataFrame(
+            {key: onehot[:, i] for i, (key, _) in enumerate(_keys(field))}
+        )
 
+    ohe.vectorized = ohe_vec
+    ohe.from_values = ohe_values
     return ohe
 
 
 def survey_matrix(
-    field: str, resp: dict[str, str | float | int | None]
+    field: str,
+    resp: dict[str, str | float | int | None],
+    out: dict[str, Any] | None = None,
 ) -> dict[str, str | float | int | None]:
     """Simple transformer that unpacks matrix respones
     Paramters
     ---------
     field : str
     resp : dict
+    out : dict, optional
+        Dictionary to update with resp
 
     Returns
     -------
     resp : dict
     """
-    return resp
+    if out is None:
+        return resp
+    out.update(resp)
+    return out
+
+
+def _survey_matrix_vec(field: str, resp: pl.Series) -> pl.DataFrame:
+    """survey_matrix for a column of responses, nulls are missing responses
+    and give null in every item"""
+    if resp.dtype == pl.Null:
+        # no survey has the matrix, so there are no items to unpack
+        return pl.DataFrame()
+    if not isinstance(resp.dtype, pl.Struct):
+        raise ValueError(f"expected matrix responses to be structs, but received {resp.dtype}")
+    return resp.struct.unnest()
+
+
+survey_matrix.vectorized = _survey_matrix_vec
 
 
 # list of items that may have an other option
@@ -177,6 +395,85 @@ OTHER_LIST = [
     "attention_diagnoses",
     "attention_treatment",
 ]
+# (other flag, other response, comment) keys for each field in OTHER_LIST
+OTHER_KEYS = [
+    (f"{field}__other", f"{field}__otherresp", f"{field}-Comment")
+    for field in OTHER_LIST
+]
+
+
+def _bind_decoder(
+    field: str, decoder: Callable
+) -> Callable[[Any, dict[str, Any]], Any]:
+    """Bind a decoder to its field as a function of (resp, out) that writes
+    the coded response into out, choosing how once instead of per row"""
+    # the common scalar decoders are inlined, falling back to the decoder
+    # itself for anything it has to check or reject
+    if decoder is yn_code:
+
+        def apply_yn(resp: Any, out: dict[str, Any]) -> None:
+            try:
+                out[field] = YN_CODES[resp]
+            except (KeyError, TypeError):
+                yn_code(field, resp, out)
+
+        return apply_yn
+    if decoder is str_code:
+
+        def apply_str(resp: Any, out: dict[str, Any]) -> None:
+            if resp.__class__ is str:
+                out[field] = resp
+            else:
+                str_code(field, resp, out)
+
+        return apply_str
+    if "out" in signature(decoder).parameters:
+        return partial(decoder, field)
+
+    def apply(resp: Any, out: dict[str, Any]) -> None:
+        out.update(decoder(field, resp))
+
+    return apply
+
+
+def compile_extractor(
+    decoders: dict[str, Callable],
+) -> Callable[[dict[str, str | None | dict[str, str | int]]], dict[str, Any]]:
+    """Build a function that extracts transformed responses with a fixed set of decoders
+    Parameters
+    ----------
+        decoders : dict
+            Dictionary of transformer functions for each field, decoders
+            that take an out argument write straight into the results
+
+    Returns
+    -------
+        extract : function
+            function taking a dictionary of survey responses and returning
+            the dictionary of results, as extract_responses does
+    """
+    # snapshot the decoders, each already bound to its field
+    get_decoder = {k: _bind_decoder(k, decoder) for k, decoder in decoders.items()}.get
+
+    def extract(
+        responses: dict[str, str | None | dict[str, str | int]],
+    ) -> dict[str, Any]:
+        result = {}
+        for k, v in responses.items():
+            apply = get_decoder(k)
+            if apply is not None:
+                apply(v, result)
+        for other_key, otherresp_key, comment_key in OTHER_KEYS:
+            if result.get(other_key):
+                result[otherresp_key] = responses.get(comment_key)
+        return result
+
+    return extract
+
+
+# extractors compiled by extract_responses, keyed on the id of the decoders
+_EXTRACTORS = {}
+_EXTRACTORS_SIZE = 32
 
 
 def extract_responses(
@@ -196,14 +493,112 @@ def extract_responses(
             Dictionary of results
 
     """
-    result = {}
-    for k, v in responses.items():
-        decoder = decoders.get(k)
-        if decoder is not None:
-            result.update(decoder(k, v))
-    for field in OTHER_LIST:
-        if result[f"{field}__other"]:
-            result[f"{field}__otherresp"]: responses[f"{field}-Comment"]
+    # compiling binds every decoder, so reuse the extractor while the decoders
+    # passed in are unchanged
+    cached = _EXTRACTORS.get(id(decoders))
+    if cached is None or cached[0] != decoders:
+        if len(_EXTRACTORS) >= _EXTRACTORS_SIZE:
+            _EXTRACTORS.clear()
+        cached = _EXTRACTORS[id(decoders)] = (dict(decoders), compile_extractor(decoders))
+    return cached[1](responses)
+
+
+def _response_columns(
+    responses: list[dict[str, Any]],
+) -> tuple[dict[str, pl.Series | list[Any]], dict[str, list[bool]]]:
+    """Gather a list of survey responses into one column per field. Fields
+    whose values do not fit a single polars dtype, such as a mix of strings
+    and lists, are kept as python lists. Also returns which rows are missing
+    each field, so they can be told apart from responses of None."""
+    fields = dict.fromkeys(field for row in responses for field in row)
+    columns = {}
+    missing = {}
+    for field in fields:
+        values = [row.get(field) for row in responses]
+        missing[field] = [field not in row for row in responses]
+        try:
+            columns[field] = pl.Series(field, values)
+        except (TypeError, pl.exceptions.PolarsError):
+            columns[field] = values
+    return columns, missing
+
+
+def extract_responses_df(
+    responses: pl.DataFrame | list[dict[str, Any]],
+    decoders: dict[str, Callable],
+) -> pl.DataFrame:
+    """Column at a time version of extract_responses for many surveys at once
+    Parameters
+    ----------
+        responses : polars dataframe or list of dict
+            One survey response per row and one field per column, or a list
+            of survey response dictionaries. Fields missing from a survey in
+            the list, or null in the dataframe, are null in its results
+        decoders : dict
+            Dictionary of transformer functions for each field, decoders
+            with a vectorized attribute are applied to the whole column,
+            decoders with a from_values attribute to the python values of
+            columns polars can not hold, and the rest are applied row by row
+    Returns
+    -------
+        results : polars dataframe
+            One row of results per survey, with the columns extract_responses
+            would produce
+    """
+    if isinstance(responses, pl.DataFrame):
+        columns = {field: responses[field] for field in responses.columns}
+        # a dataframe can not tell a missing field from a None response
+        missing = {field: column.is_null().to_list() for field, column in columns.items()}
+    else:
+        columns, missing = _response_columns(responses)
+    frames = []
+    for field, column in columns.items():
+        decoder = decoders.get(field)
+        if decoder is None:
+            continue
+        vectorized = getattr(decoder, "vectorized", None)
+        from_values = getattr(decoder, "from_values", None)
+        absent = missing[field]
+        if vectorized is not None and isinstance(column, pl.Series):
+            # vectorized decoders leave nulls null, responses of None are
+            # decoded, or rejected, row by row as extract_responses would
+            frame = vectorized(field, column)
+            if column.null_count() > sum(absent):
+                is_none = pl.lit(column.is_null() & ~pl.Series(absent))
+                frame = frame.with_columns(
+                    pl.when(is_none).then(pl.lit(value)).otherwise(pl.col(key)).alias(key)
+                    for key, value in decoder(field, None).items()
+                )
+        elif from_values is not None:
+            if isinstance(column, pl.Series):
+                column = column.to_list()
+            frame = from_values(field, column)
+        else:
+            if isinstance(column, pl.Series):
+                column = column.to_list()
+            frame = pl.DataFrame(
+                [{} if skip else decoder(field, v) for v, skip in zip(column, absent)],
+                infer_schema_length=None,
+            )
+        if any(absent):
+            frame = frame.with_columns(
+                pl.when(~pl.lit(pl.Series(absent))).then(pl.col(key)).alias(key)
+                for key in frame.columns
+            )
+        frames.append(frame)
+    if not frames:
+        return pl.DataFrame()
+    result = pl.concat(frames, how="horizontal")
+    for other_key, otherresp_key, comment_key in OTHER_KEYS:
+        if other_key not in result.columns or not result[other_key].any():
+            continue
+        if comment_key in columns:
+            comment = pl.lit(pl.Series(comment_key, columns[comment_key], strict=False))
+        else:
+            comment = pl.lit(None, dtype=pl.String)
+        result = result.with_columns(
+            pl.when(pl.col(other_key)).then(comment).alias(otherresp_key)
+        )
     return result
 
 
@@ -520,6 +915,9 @@ SURVEY_DECODE = {
     "hunger": likert_code,
 }
 
+# extract_responses with SURVEY_DECODE, compiled once
+SURVEY_EXTRACTOR = compile_extractor(SURVEY_DECODE)
+
 
 COL_LUT = {
     'mood_diagnoses__major_depressive_disorder': 'mood_diagnoses__mdd',
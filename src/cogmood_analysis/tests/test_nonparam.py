@@ -1,10 +1,13 @@
+import itertools
+import warnings
 import numpy as np
 import pandas as pd
 import statsmodels.api as sm
 import patsy
 import pytest
 from numpy.testing import assert_allclose, assert_array_equal
-from cogmood_analysis.nonparam import run_reg_boots, run_reg_perms
+from cogmood_analysis.nonparam import run_reg_boots, run_reg_perms, run_all_perms, run_all_boots, run_reg_perms_many, _perm_tstats, _reduced_fit, _boot_ssr_t
+from cogmood_analysis.nonparam import _nuisance_design, NUISANCE_FORMULA
 
 # these tests were written by Claude Sonnet 4.5
 
@@ -31,10 +34,7 @@ def test_run_reg_boots():
     
     # Create bootstrap indices using pandas index
     n_boots = 10
-    boot_indexes = np.column_stack([
-        np.random.choice(dat.index, size=len(dat), replace=True) 
-        for _ in range(n_boots)
-    ])
+    boot_indexes = np.random.choice(dat.index, size=(len(dat), n_boots), replace=True)
     
     # Run the function
     result = run_reg_boots(
@@ -102,10 +102,7 @@ def test_run_reg_boots_with_nonsequential_index():
     
     # Create bootstrap indices using the actual pandas index
     n_boots = 5
-    boot_indexes = np.column_stack([
-        np.random.choice(dat.index, size=len(dat), replace=True) 
-        for _ in range(n_boots)
-    ])
+    boot_indexes = np.random.choice(dat.index, size=(len(dat), n_boots), replace=True)
     
     # This should not raise an error
     result = run_reg_boots(
@@ -122,6 +119,112 @@ def test_run_reg_boots_with_nonsequential_index():
     print("✓ Non-sequential index test passed!")
 
 
+def test_run_all_boots():
+    """Test that the parallel sweep matches calling run_reg_boots in a loop"""
+    np.random.seed(5)
+    n = 80
+    dat = pd.DataFrame({
+        'age': np.random.uniform(20, 80, n),
+        'sex': np.random.choice([0, 1], n),
+        'brain_volume': np.random.normal(1000, 100, n),
+        'cortical_thickness': np.random.normal(2.5, 0.2, n),
+        'iq_score': np.random.normal(100, 15, n)
+    })
+    dat['age2'] = dat['age'] ** 2
+    boot_indexes = np.random.choice(dat.index, size=(len(dat), 20), replace=True)
+    triples = [('test', 'brain_volume', 'iq_score'), ('test', 'cortical_thickness', 'iq_score')]
+    results = run_all_boots(triples, dat, boot_indexes, n_jobs=2)
+    for (task, tp, ss), result in zip(triples, results):
+        expected = run_reg_boots(task, tp, ss, dat, boot_indexes)
+        assert result.keys() == expected.keys()
+        for key, value in expected.items():
+            if isinstance(value, str):
+                assert result[key] == value
+            else:
+                assert_allclose(result[key], value, rtol=1e-10)
+
+
+def test_boot_ssr_t_matches_statsmodels():
+    """Test that the batched bootstrap fits match statsmodels fit resample by resample"""
+    np.random.seed(11)
+    n = 60
+    X = np.column_stack([np.ones(n), np.random.randn(n), np.random.randn(n)])
+    y = X @ np.array([1.0, 0.5, -0.3]) + np.random.randn(n)
+    boot_pos = np.random.randint(0, n, size=(n, 9))
+    
+    ssr, t = _boot_ssr_t(X, y, boot_pos, tp_idx=2, block_size=4)
+    for bid in range(boot_pos.shape[1]):
+        model = sm.OLS(y[boot_pos[:, bid]], X[boot_pos[:, bid]]).fit()
+        assert_allclose(ssr[bid], model.ssr, rtol=1e-10)
+        assert_allclose(t[bid], model.tvalues[2], rtol=1e-10)
+
+
+def test_boot_ssr_t_rank_deficient_resample():
+    """Test that a resample drawing only one sex is fit like statsmodels instead of failing"""
+    np.random.seed(12)
+    n = 60
+    age = np.random.uniform(20, 80, n)
+    sex = np.random.choice([0., 1.], n)
+    X = np.column_stack([np.ones(n), age, age ** 2, sex, age * sex, age ** 2 * sex, np.random.randn(n)])
+    y = np.random.randn(n)
+    boot_pos = np.random.randint(0, n, size=(n, 5))
+    boot_pos[:, 2] = np.random.choice(np.flatnonzero(sex == 0), n)
+    
+    ssr, t = _boot_ssr_t(X, y, boot_pos, tp_idx=6, block_size=4)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for bid in range(boot_pos.shape[1]):
+            model = sm.OLS(y[boot_pos[:, bid]], X[boot_pos[:, bid]]).fit()
+            assert_allclose(ssr[bid], model.ssr, rtol=1e-10)
+            assert_allclose(t[bid], model.tvalues[6], rtol=1e-8)
+    
+    dat = pd.DataFrame({'age': age, 'age2': age ** 2, 'sex': sex.astype(int), 'tp': X[:, 6], 'score': y})
+    result = run_reg_boots('test', 'tp', 'score', dat, boot_pos)
+    assert np.isfinite(result['boot_t_mean'])
+
+
+def test_run_reg_boots_use_gpu():
+    """Test that the GPU bootstraps match the CPU ones, or ask for cupy when it is missing"""
+    np.random.seed(13)
+    n = 80
+    dat = pd.DataFrame({
+        'age': np.random.uniform(20, 80, n),
+        'sex': np.random.choice([0, 1], n),
+        'brain_volume': np.random.normal(1000, 100, n),
+        'iq_score': np.random.normal(100, 15, n)
+    })
+    dat['age2'] = dat['age'] ** 2
+    boot_indexes = np.random.choice(dat.index, size=(len(dat), 20), replace=True)
+    try:
+        import cupy
+    except ImportError:
+        with pytest.raises(ImportError):
+            run_reg_boots('test', 'brain_volume', 'iq_score', dat, boot_indexes, use_gpu=True)
+        return
+    cpu = run_reg_boots('test', 'brain_volume', 'iq_score', dat, boot_indexes)
+    gpu = run_reg_boots('test', 'brain_volume', 'iq_score', dat, boot_indexes, use_gpu=True)
+    for key, value in cpu.items():
+        if isinstance(value, str):
+            assert gpu[key] == value
+        else:
+            assert_allclose(gpu[key], value, rtol=1e-8)
+
+
+@pytest.mark.parametrize('sex', [
+    np.array([0, 1, 1, 0, 1, 0, 0, 1]),
+    np.array([0., 1., 1., 0., 1., 0., 0., 1.]),
+    np.array([False, True, True, False, True, False, False, True]),
+    np.array(['Male', 'Female', 'Other', 'Male', 'Female', 'Other', 'Male', 'Female']),
+])
+def test_nuisance_design_matches_patsy(sex):
+    """Test that the hand built nuisance design has patsy's columns, order and values"""
+    np.random.seed(3)
+    dat = pd.DataFrame({'age': np.random.uniform(20, 80, len(sex)), 'sex': sex})
+    dat['age2'] = dat['age'] ** 2
+    expected = patsy.dmatrix(NUISANCE_FORMULA, dat, return_type='dataframe')
+    pd.testing.assert_frame_equal(_nuisance_design(dat), expected, check_dtype=False)
+
+
 @pytest.fixture
 def sample_data():
     """Create sample data for testing."""
@@ -168,9 +271,10 @@ def perm_indexes():
     np.random.seed(123)
     n = 100
     n_perms = 10
-    return np.array([np.random.permutation(n) for _ in range(n_perms)]).T
+    return np.random.rand(n, n_perms).argsort(axis=0)
 
 
+@pytest.mark.xdist_group('nonparam')
 class TestRunRegPerms:
     
     def test_basic_functionality(self, sample_data, perm_indexes):
@@ -244,7 +348,7 @@ class TestRunRegPerms:
         n = len(sample_data)
         
         for n_perms in [5, 50, 100]:
-            perm_idx = np.array([np.random.permutation(n) for _ in range(n_perms)]).T
+            perm_idx = np.random.rand(n, n_perms).argsort(axis=0)
             result = run_reg_perms(
                 task='test',
                 tp='predictor',
@@ -267,7 +371,7 @@ class TestRunRegPerms:
         # Make score strongly dependent on predictor
         data['score'] = 5 * data['predictor'] + np.random.randn(n) * 0.1
         
-        perm_idx = np.array([np.random.permutation(n) for _ in range(100)]).T
+        perm_idx = np.random.rand(n, 100).argsort(axis=0)
         
         result = run_reg_perms(
             task='test',
@@ -294,7 +398,7 @@ class TestRunRegPerms:
         })
         data['age2'] = data['age'] ** 2
         
-        perm_idx = np.array([np.random.permutation(n) for _ in range(100)]).T
+        perm_idx = np.random.rand(n, 100).argsort(axis=0)
         
         result = run_reg_perms(
             task='test',
@@ -311,7 +415,7 @@ class TestRunRegPerms:
     def test_reproducibility(self, sample_data):
         """Test that same inputs give same results."""
         np.random.seed(999)
-        perm_idx = np.array([np.random.permutation(len(sample_data)) for _ in range(10)]).T
+        perm_idx = np.random.rand(len(sample_data), 10).argsort(axis=0)
         
         result1 = run_reg_perms('test', 'predictor', 'score', sample_data, perm_idx)
         result2 = run_reg_perms('test', 'predictor', 'score', sample_data, perm_idx)
@@ -410,7 +514,7 @@ class TestRunRegPerms:
         
         # Same permutations for both
         np.random.seed(123)
-        perm_idx = np.array([np.random.permutation(n) for _ in range(10)]).T
+        perm_idx = np.random.rand(n, 10).argsort(axis=0)
         
         result_contiguous = run_reg_perms(
             'test', 'predictor', 'score', data_contiguous, perm_idx
@@ -443,7 +547,7 @@ class TestRunRegPerms:
         assert len(data) == 100
         assert data.index.max() == 990
         
-        perm_idx = np.array([np.random.permutation(n) for _ in range(10)]).T
+        perm_idx = np.random.rand(n, 10).argsort(axis=0)
         
         result = run_reg_perms(
             task='test_large_gaps',
@@ -474,7 +578,7 @@ class TestRunRegPerms:
         random_index = np.random.choice(range(1000), size=n, replace=False)
         data.index = random_index
         
-        perm_idx = np.array([np.random.permutation(n) for _ in range(10)]).T
+        perm_idx = np.random.rand(n, 10).argsort(axis=0)
         
         result = run_reg_perms(
             task='test_random_index',
@@ -535,7 +639,7 @@ class TestRunRegPerms:
         
         # Same permutations
         np.random.seed(123)
-        perm_idx = np.array([np.random.permutation(100) for _ in range(20)]).T
+        perm_idx = np.random.rand(100, 20).argsort(axis=0)
         
         result_gaps = run_reg_perms('test', 'predictor', 'score', data_with_gaps, perm_idx)
         result_reset = run_reg_perms('test', 'predictor', 'score', data_reset, perm_idx)
@@ -543,4 +647,96 @@ class TestRunRegPerms:
         # Should be identical
         assert_allclose(result_gaps['t'], result_reset['t'], rtol=1e-10)
         assert_allclose(result_gaps['full_r2'], result_reset['full_r2'], rtol=1e-10)
-        assert_allclose(result_gaps['perm_p'], result_reset['perm_p'], rtol=1e-10)
\ No newline at end of file
+        assert_allclose(result_gaps['perm_p'], result_reset['perm_p'], rtol=1e-10)
+    
+    def test_perm_tstats_block_size(self, sample_data):
+        """Test that processing permutations in blocks does not change the t-statistics."""
+        np.random.seed(7)
+        n = len(sample_data)
+        perm_idx = np.random.rand(n, 50).argsort(axis=0)
+        X = np.column_stack([np.ones(n), sample_data['age'], sample_data['predictor']])
+        Q, R = np.linalg.qr(X)
+        r_tp = np.linalg.inv(R)[2]
+        fitted = X[:, :2] @ np.linalg.lstsq(X[:, :2], sample_data['score'], rcond=None)[0]
+        resid = sample_data['score'].values - fitted
+        
+        t_all = _perm_tstats(Q, r_tp, np.sqrt(r_tp @ r_tp), fitted, resid, perm_idx)
+        t_blocked = _perm_tstats(
+            Q, r_tp, np.sqrt(r_tp @ r_tp), fitted, resid, perm_idx, block_size=7
+        )
+        assert t_all.shape == (50,)
+        assert_allclose(t_all, t_blocked, rtol=1e-12)
+    
+    def test_use_gpu(self, sample_data, perm_indexes):
+        """Test that the GPU path matches the CPU one, or asks for cupy when it is missing."""
+        try:
+            import cupy
+        except ImportError:
+            with pytest.raises(ImportError):
+                run_reg_perms('test', 'predictor', 'score', sample_data, perm_indexes, use_gpu=True)
+            return
+        cpu = run_reg_perms('test', 'predictor', 'score', sample_data, perm_indexes)
+        gpu = run_reg_perms('test', 'predictor', 'score', sample_data, perm_indexes, use_gpu=True)
+        assert gpu['perm_p'] == cpu['perm_p']
+    
+    def test_run_all_perms(self, sample_data, perm_indexes):
+        """Test that the parallel sweep matches calling run_reg_perms in a loop."""
+        sample_data = sample_data.assign(other=np.random.randn(len(sample_data)))
+        triples = [('test', 'predictor', 'score'), ('test', 'other', 'score')]
+        results = run_all_perms(triples, sample_data, perm_indexes, n_jobs=2)
+        for (task, tp, ss), result in zip(triples, results):
+            assert result == run_reg_perms(task, tp, ss, sample_data, perm_indexes)
+    
+    def test_run_reg_perms_many(self, sample_data):
+        """Test that the batched sweep matches run_reg_perms for every tp and ss."""
+        np.random.seed(3)
+        n = len(sample_data)
+        sample_data = sample_data.assign(
+            other=np.random.randn(n), score2=np.random.randn(n)
+        )
+        perm_idx = np.random.rand(n, 200).argsort(axis=0)
+        tps, sss = ['predictor', 'other'], ['score', 'score2']
+        results = run_reg_perms_many('test', tps, sss, sample_data, perm_idx)
+        assert len(results) == 4
+        for (tp, ss), result in zip(itertools.product(tps, sss), results):
+            expected = run_reg_perms('test', tp, ss, sample_data, perm_idx)
+            assert result.keys() == expected.keys()
+            assert (result['parameter'], result['score']) == (tp, ss)
+            assert result['perm_p'] == expected['perm_p']
+            for key in ['t', 'full_r2', 'partial_r2']:
+                assert_allclose(result[key], expected[key], rtol=1e-10)
+    
+    def test_perm_tstats_float32(self, sample_data):
+        """Test that the float32 permutation kernel stays close to float64."""
+        np.random.seed(7)
+        n = len(sample_data)
+        perm_idx = np.random.rand(n, 50).argsort(axis=0)
+        X = np.column_stack([np.ones(n), sample_data['age'], sample_data['predictor']])
+        Q, R = np.linalg.qr(X)
+        r_tp = np.linalg.inv(R)[2]
+        fitted = X[:, :2] @ np.linalg.lstsq(X[:, :2], sample_data['score'], rcond=None)[0]
+        resid = sample_data['score'].values - fitted
+        
+        args = (Q, r_tp, np.sqrt(r_tp @ r_tp), fitted, resid, perm_idx)
+        t_64 = _perm_tstats(*args)
+        t_32 = _perm_tstats(*args, dtype=np.float32)
+        # the projection really ran in float32, so it rounds differently
+        assert not np.array_equal(t_32, t_64)
+        assert_allclose(t_32, t_64, rtol=1e-4, atol=1e-5)
+    
+    def test_reduced_fit_reused_across_tp(self, sample_data, perm_indexes):
+        """Test that the reduced model is shared between tp values but not across data changes."""
+        sample_data = sample_data.assign(other=np.random.randn(len(sample_data)))
+        first = _reduced_fit('score', sample_data)
+        assert _reduced_fit('score', sample_data.copy()) is first
+        
+        result = run_reg_perms('test', 'other', 'score', sample_data, perm_indexes)
+        assert _reduced_fit('score', sample_data) is first
+        assert 0 <= result['perm_p'] <= 1
+        
+        changed = sample_data.assign(score=sample_data['score'] + 1)
+        assert _reduced_fit('score', changed) is not first
+        
+        categorical = sample_data.assign(sex=pd.Categorical(np.where(sample_data['sex'], 'M', 'F')))
+        reordered = categorical.assign(sex=categorical['sex'].cat.reorder_categories(['M', 'F']))
+        assert _reduced_fit('score', categorical) is not _reduced_fit('score', reordered)
@@ -40,6 +40,9 @@ def test_num_code():
     res = sh.num_code("jubba", None)
     assert res["jubba"] is None
 
+    res = sh.num_code("jubba", "")
+    assert res["jubba"] is None
+
     with raises(ValueError):
         sh.num_code("jubba", "wubba")
 
@@ -51,7 +54,7 @@ def test_likert_code():
     with raises(ValueError):
         sh.likert_code("jubba", "wubba")
 
-    with raises((ValueError, AttributeError)):
+    with raises(ValueError):
         sh.likert_code("jubba", None)
 
 
@@ -86,6 +89,8 @@ def test_ohe_fac():
     assert res["jubba__todayphq8_3"] == False
     assert res["jubba__todayphq8_1"] == False
     assert res["jubba__todaygad7_5"] == False
+    res["jubba__todayphq8_3"] = True
+    assert ohea("jubba", []) == dict.fromkeys(res, False)
 
     res = oheb("jubba", "none")
     assert res["jubba__attention_deficit_hyperactivity_disorder_adhd_"] == False
@@ -99,9 +104,19 @@ def test_ohe_fac():
     assert res["jubba__other"] == True
     assert res["jubba__none"] == False
 
+    res = ohea("jubba", {"todayphq8__1"})
+    assert res["jubba__todayphq8_3"] == False
+    assert res["jubba__todayphq8_1"] == True
+
     with raises(ValueError):
         ohea("jubba", "wubba")
 
+    assert sh.ohe_fac(["todaygad7__5", "todayphq8__1", "todayphq8__3"]) is ohea
+
+    values = [["One-on-one"], "other", None, {"none", "One-on-one"}]
+    res = oheb.from_values("jubba", values)
+    assert res.equals(pl.DataFrame([oheb("jubba", v) for v in values]))
+
 
 def test_survey_matrix():
     res = sh.survey_matrix("jubba", {"foo": 1, "bar": "wubba"})
@@ -124,3 +139,101 @@ def test_extract_resp():
         Path(__file__).parent / "test_data/parsed_survey1.parquet"
     )
     assert response.equals(expected)
+
+
+def test_compile_extractor():
+    responses = json.loads(
+        (Path(__file__).parent / "test_data/surveyexpectedoutput_1.json").read_text()
+    )
+    extract = sh.compile_extractor(sh.SURVEY_DECODE)
+    expected = sh.extract_responses(responses, decoders=sh.SURVEY_DECODE)
+    assert extract(responses) == expected
+    assert sh.SURVEY_EXTRACTOR(responses) == expected
+
+
+def test_extract_other_response():
+    decoders = {"mood_diagnoses": sh.ohe_fac(["Depression"], other=True)}
+    res = sh.extract_responses(
+        {"mood_diagnoses": ["other"], "mood_diagnoses-Comment": "wubba"}, decoders
+    )
+    assert res["mood_diagnoses__other"] == True
+    assert res["mood_diagnoses__otherresp"] == "wubba"
+
+    res = sh.extract_responses({"mood_diagnoses": ["Depression"]}, decoders)
+    assert "mood_diagnoses__otherresp" not in res
+
+    res = sh.extract_responses({}, decoders)
+    assert res == {}
+
+
+def test_extract_responses_df():
+    responses = json.loads(
+        (Path(__file__).parent / "test_data/surveyexpectedoutput_1.json").read_text()
+    )
+    other = dict(responses)
+    other["mood_diagnoses"] = responses["mood_diagnoses"] + ["other"]
+    other["mood_diagnoses-Comment"] = "wubba"
+    rows = [responses, other, responses]
+
+    response = sh.extract_responses_df(pl.DataFrame(rows), sh.SURVEY_DECODE)
+    expected = pl.DataFrame(
+        [sh.extract_responses(row, sh.SURVEY_DECODE) for row in rows],
+        infer_schema_length=None,
+    )
+    assert response.equals(expected)
+    assert response["mood_diagnoses__otherresp"].to_list() == [None, "wubba", None]
+
+    # lists of responses may mix single answers and lists in one field
+    mixed = dict(responses)
+    mixed["ethnicity"] = [responses["ethnicity"]]
+    rows = [responses, other, mixed]
+    response = sh.extract_responses_df(rows, sh.SURVEY_DECODE)
+    expected = pl.DataFrame(
+        [sh.extract_responses(row, sh.SURVEY_DECODE) for row in rows],
+        infer_schema_length=None,
+    )
+    assert response.equals(expected)
+
+    # fields missing from a survey are null, as when stacking the rows
+    partial = {
+        key: value
+        for key, value in responses.items()
+        if key not in (
+            "race", "ethnicity", "age", "ladder_resp",
+            "ongoing_mentalhealth", "baaars_inattention", "fatigue",
+        )
+    }
+    rows = [responses, partial, other]
+    response = sh.extract_responses_df(rows, sh.SURVEY_DECODE)
+    expected = pl.DataFrame(
+        [sh.extract_responses(row, sh.SURVEY_DECODE) for row in rows],
+        infer_schema_length=None,
+    )
+    assert response.equals(expected)
+    assert response.row(1, named=True)["race__white"] is None
+    assert response.row(1, named=True)["fatigue"] is None
+
+    # but a response of None is decoded as extract_responses would
+    with raises(ValueError):
+        sh.extract_responses_df([responses, dict(responses, ladder_resp=None)], sh.SURVEY_DECODE)
+
+    with raises(ValueError):
+        sh.extract_responses_df(
+            pl.DataFrame({"have_adhd": ["Yes", "3"]}), sh.SURVEY_DECODE
+        )
+
+
+def test_decoders_write_out():
+    out = {"foo": 1}
+    assert sh.yn_code("jubba", "Yes", out) is out
+    sh.num_code("wubba", "3", out)
+    sh.ohe_fac(["A", "B"])("dubba", ["B"], out)
+    sh.survey_matrix("matrix", {"bar": "wubba"}, out)
+    assert out == {
+        "foo": 1,
+        "jubba": True,
+        "wubba": 3.0,
+        "dubba__a": False,
+        "dubba__b": True,
+        "bar": "wubba",
+    }